@@ -1,94 +1,71 @@
-import scipy
 import streamlit as st
-from plotly.subplots import make_subplots
-import plotly.figure_factory as ff
 import plotly.graph_objects as go
 import plotly.express as px
-import seaborn as sns
-import matplotlib.pyplot as plt
 import warnings
 import numpy as np
 import pandas as pd
+from analysis_utils import load_insurance, all_group_stats, state_stats, kde_curves, value_proportions, \
+    filter_options, filter_mask, claim_summary, summary_statistics, SUMMARY_STATISTICS, scatter_group_options
 pd.set_option("display.max_columns", None)
 
 warnings.filterwarnings("ignore")
 
 
-# Processing for insurance data
-def preprocess_insurance_data(data):
+def _apply_px_kwargs(fig, template=None, color_discrete_sequence=None, layout=None):
     """
-    Preprocessing steps for Insurance_claims_mendeleydata_6.csv
-    to be transformed in a manner that allows for state-wise visualization
+    Applies the keyword arguments accepted by the plotly_* helpers built with graph_objects
+    (plotly_mean_median_bar, plotly_injury_bar, plotly_pie, plotly_age_hist, plotly_filtered_claims).
+    Only these keywords are supported, other plotly express arguments raise a TypeError
 
     Args
-    ---------------
-    data: pd.DataFrame | pandas dataframe to be used for state-wise plots
+    -----------
+    fig: go.Figure | figure to be styled in place
+    template: str | plotly template name, None keeps the default template
+    color_discrete_sequence: list | colors cycled over the traces (over the slices of a pie),
+    None keeps the template colors
+    layout: dict | layout properties, e.g. height or xaxis tickvals, passed to fig.update_layout
 
     Returns
-    ---------------
-    data : pd.DataFrame | preprocessed with minimal steps 
-
-    Errors Raised
-    ---------------
-    KeyError | if data with different column names is used, then this function will raise an error
-
+    -----------
+    plotly figure | the styled figure
     """
+    if template is not None:
+        fig.update_layout(template=template)
 
-    data = data.rename(columns={"total_claim_amount": "claim_amount",
-                                "insured_sex": "gender"})
-    data["gender"] = data["gender"].str.title()
-
-    # Bins for Age Plots
-    # bins = [-np.inf, 2, 12, 18, 35, 60, np.inf]
-    # labels = ["Infant 0-2", "Child 2-12", "Teenager 12-18", "Young Adult 18-35",
-    #       "Adult 35-60", "Senior Citizen 60+"]
-
-    # Bins #2
-    bins = [15, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65]
-    labels = ["15-20", "20-25", "25-30", "30-35", "35-40", "40-45", "45-50", "50-55", "55-60",
-              "60-65"]
+    if color_discrete_sequence:
+        for i, trace in enumerate(fig.data):
+            if isinstance(trace, go.Pie):
+                trace.marker.colors = [color_discrete_sequence[j % len(color_discrete_sequence)]
+                                       for j in range(len(trace.labels))]
+            else:
+                trace.marker.color = color_discrete_sequence[i % len(color_discrete_sequence)]
 
-    data["age_bracket"] = pd.cut(data["age"], bins=bins, labels=labels)
+    if layout:
+        fig.update_layout(**layout)
 
-    data = data.drop(columns=["policy_state", "policy_csl", "policy_deductable", "policy_annual_premium",
-                     "umbrella_limit", "policy_number", "capital-gains", "capital-loss", "city", "injury_claim",
-                              "property_claim", "vehicle_claim"])
-
-    data["collision_type"] = data["collision_type"].str.replace(
-        "?", "Unattended Vehicle")
-
-    return data
+    return fig
 
 
 # Statewise Plots -------------------------------------------
 
-def plotly_states(data):
+def plotly_states(stats):
     """
     Function to generate a plotly figure of barplots of mean and median state claim values for car accidents
     compatible with sample_data_formatted.csv and Insurance_claims_mendeleydata_6.csv
 
     Args
     -----------
-    data: pd.DataFrame | data with columns: ["state", "total_claim_amount"]
+    stats: StateStats | output of analysis_utils.state_stats, states sorted by median with "Other" filtered out
 
     Returns
     -----------
     plotly figure | barplot with hover values of State, Mean/Median Value 
-
-    Errors
-    -----------
-    KeyError if data do not contain the correct columns
     """
 
-    # Filtering out miscellaneous states
-    data = data[data["state"] != "Other"]
-
-    # Grouping data by state and calculating median and mean
-    grouped = data.groupby("state")["claim_amount"].agg(
-        ["median", "mean"]).sort_values(by="median", ascending=False)
-
-    # Resetting index to make 'state' a column for Plotly
-    grouped = grouped.reset_index()
+    # Median and mean by state sorted by median
+    grouped = pd.DataFrame({"state": stats.order,
+                            "median": stats.medians.to_numpy(),
+                            "mean": stats.means.to_numpy()})
 
     # Creating Plotly figure
     fig = px.bar(grouped, x='state', y=['median', 'mean'],
@@ -111,38 +88,29 @@ def plotly_states(data):
 
 # Boxplots for State Car Accident Claim Distributions
 
-def plotly_box_states(data):
+def plotly_box_states(stats):
     """
     Function to generate a plotly figure of boxplots of car accidents claim distributions by state
     compatible with sample_data_formatted.csv and Insurance_claims_mendeleydata_6.csv
 
     Args
     -----------
-    data: pd.DataFrame | data with columns: ["state", "claim_amount"]
+    stats: StateStats | output of analysis_utils.state_stats, per-state claim values and quartiles
 
     Returns
     -----------
     plotly figure | boxplot with hover values of State, [min, lower fence, 25 percentile, median, 75 percentile, upper fence, max] 
-
-    Errors
-    -----------
-    KeyError if data do not contain the correct columns
     """
 
-    # Filter Data for States == Other
-    data = data[data["state"] != "Other"]
-
     # Creating a list of states ordered by their median percentile value
     # to provide a left-to-right visual structure
-    upper_q = list(data.groupby("state")[
-                   "claim_amount"].median().sort_values(ascending=False).index)
+    upper_q = stats.order
 
     # Create traces for each state -> this was the only way I could get the whisker/plot scale correct
     traces = []
     for state in upper_q:
-        state_data = data[data['state'] == state]
         trace = go.Box(
-            y=state_data['claim_amount'],
+            y=stats.values[state],
             name=state,
             boxpoints='all',  # Show all points to maintain correct whisker length
             jitter=0.3,
@@ -170,10 +138,7 @@ def plotly_box_states(data):
     )
 
     # Calculate IQR for each state to determine y-axis range
-    iqr_ranges = data.groupby('state')['claim_amount'].apply(
-        lambda x: (x.quantile(0.25), x.quantile(0.75)))
-    iqr_min, iqr_max = iqr_ranges.apply(
-        lambda x: x[0]).min(), iqr_ranges.apply(lambda x: x[1]).max()
+    iqr_min, iqr_max = stats.q25.min(), stats.q75.max()
     iqr = iqr_max - iqr_min
 
     # Update y-axis range to be slightly larger than the IQR range
@@ -201,33 +166,32 @@ def plotly_gender(data):
     -----------
     KeyError if data do not contain the correct columns
     """
-    male_data = data.query("gender == 'Male'")['claim_amount']
-    female_data = data.query("gender == 'Female'")['claim_amount']
+    gender = data["gender"].to_numpy()
+    claims = data["claim_amount"].to_numpy()
+    male_data = claims[gender == "Male"]
+    female_data = claims[gender == "Female"]
 
-    male_median_x = male_data.median().round(2)
-    female_median_x = female_data.median().round(2)
+    male_median_x = np.median(male_data).round(2)
+    female_median_x = np.median(female_data).round(2)
 
-    male_kde = ff.create_distplot([male_data], group_labels=[
-                                  'Male'], show_hist=False, show_rug=False)
-    female_kde = ff.create_distplot([female_data], group_labels=[
-                                    'Female'], show_hist=False, show_rug=False)
+    kde_x, male_kde_y, female_kde_y = kde_curves(male_data, female_data)
 
     # Create the overlaid plot
     fig = go.Figure()
 
     # Male KDE Plot
-    fig.add_trace(go.Scatter(x=male_kde['data'][0]['x'], y=male_kde['data'][0]['y'],
+    fig.add_trace(go.Scatter(x=kde_x, y=male_kde_y,
                              mode='lines', name='Male', fill='tozeroy', line=dict(color='blue'), opacity=0.1,
                              hoverinfo='x', xhoverformat="$,.2f", hovertemplate='Claim Amount: %{x:$,.2f}'))
 
     # Female KDE Plot
-    fig.add_trace(go.Scatter(x=female_kde['data'][0]['x'], y=female_kde['data'][0]['y'],
+    fig.add_trace(go.Scatter(x=kde_x, y=female_kde_y,
                              mode='lines', name='Female', fill='tozeroy', line=dict(color='lightcoral'), opacity=0.1,
                              hoverinfo='x', xhoverformat="$,.2f", hovertemplate='Claim Amount: %{x:$,.2f}'))
 
     # Adding vertical lines for medians as scatter traces for legend
-    male_median_y = max(male_kde['data'][0]['y'])
-    female_median_y = max(female_kde['data'][0]['y'])
+    male_median_y = max(male_kde_y)
+    female_median_y = max(female_kde_y)
 
     fig.add_trace(go.Scatter(
         x=[male_median_x, male_median_x], y=[0, male_median_y],
@@ -300,16 +264,19 @@ def plotly_gender(data):
 #     # Plot for different types of injuries from the Sample Data
 
 
-def plotly_injury_bar(data, group, **kwargs):
+def plotly_injury_bar(stats, group, **kwargs):
     """
-    Compatible with Sample Dataset, inverts x and y 
+    Compatible with Sample Dataset, inverts x and y. stats is the mean/median table of group from all_group_stats
     """
-    grouped = data.groupby(group)["claim_amount"].agg(["mean", "median"]).round(2).reset_index(
+    grouped = stats.round(2).reset_index(
     ).sort_values(by="median", ascending=True).rename(columns={"mean": "Mean", "median": "Median"})
-    fig = px.bar(data_frame=grouped, y=group, x=['Median', 'Mean'],
-                 labels={'value': "Claim Value", group: group.replace(
-                     "_", " ").title(), "variable": "Statistic"},
-                 title=f'Mean and Median Claims by {group.replace("_", " ").title()}', barmode='group', **kwargs)
+    group_title = group.replace("_", " ").title()
+    fig = go.Figure([go.Bar(y=grouped[group], x=grouped[statistic], name=statistic, orientation="h",
+                            hovertemplate=f"Statistic={statistic}<br>Claim Value=%{{x}}<br>{group_title}=%{{y}}<extra></extra>")
+                     for statistic in ["Median", "Mean"]])
+    fig.update_layout(title=f'Mean and Median Claims by {group_title}', barmode='group',
+                      xaxis_title="Claim Value", yaxis_title=group_title, legend_title_text="Statistic")
+    _apply_px_kwargs(fig, **kwargs)
     # fig.update_layout(showlegend=True, width=1200, height=675)
     fig.update_layout(showlegend=True)
     fig.update_layout(xaxis=dict(tickformat='$,.2f'))
@@ -345,12 +312,11 @@ def plotly_injury_bar(data, group, **kwargs):
 
 
 def plotly_age(data):
-    age_data = data.dropna(subset="age")
-    age_data["age"] = age_data["age"].astype("int8")
-    age_data = age_data.sort_values(by="age", ascending=True)
+    # groupby already sorts by age, and ages are read as int8 by load_insurance
+    grouped = data.dropna(subset=["age"]).groupby("age", observed=True, sort=True)["claim_amount"].median()\
+        .round(-2).reset_index(name="median")
 
-    fig = px.line(age_data.groupby("age")["claim_amount"].agg(["median"])
-                  .round(-2).reset_index(), x="age", y="median",
+    fig = px.line(grouped, x="age", y="median",
                   labels={"median": "Median Claim", "age": "Age"}, title="Median Claim Value by Age")
     fig.update_traces(name="Median Claim Value", showlegend=True)
     fig.update_layout(legend_title="")
@@ -360,8 +326,13 @@ def plotly_age(data):
 
 
 def plotly_age_hist(data, **kwargs):
-    fig = px.histogram(data_frame=data["age"], labels={
-                       "age": "Age"}, title="Number of Claims by Age", **kwargs)
+    # One bin per year of age, counted here so only the counts are sent to the browser
+    ages = data["age"].dropna().to_numpy()
+    counts, edges = np.histogram(ages, bins=np.arange(ages.min(), ages.max() + 2))
+
+    fig = go.Figure(go.Bar(x=edges[:-1], y=counts))
+    fig.update_layout(title="Number of Claims by Age", bargap=0)
+    _apply_px_kwargs(fig, **kwargs)
     fig.update_layout(legend_title="", xaxis={"title": "Age"}, yaxis={
                       "title": "Number of Claims"}, showlegend=False)
     fig.update_traces(
@@ -382,8 +353,8 @@ def plotly_age_hist(data, **kwargs):
 #     return fig
 
 
-def plotly_age_bracket(data, **kwargs):
-    group = data.groupby("age_bracket")["claim_amount"].agg(["median", "mean"]).round(-2).sort_index(ascending=False)\
+def plotly_age_bracket(stats, **kwargs):
+    group = stats[["median", "mean"]].round(-2).sort_index(ascending=False)\
         .rename(columns={"median": "Median", "mean": "Mean"})
 
     fig = px.bar(data_frame=group.reset_index(), y="age_bracket", x=["Median", "Mean"],
@@ -400,8 +371,8 @@ def plotly_age_bracket(data, **kwargs):
     return fig
 
 
-def plotly_age_line(data, group, **kwargs):
-    grouped = data.groupby(group)["claim_amount"].agg(["median", "mean"]).round(-2).sort_index()\
+def plotly_age_line(stats, group, **kwargs):
+    grouped = stats[["median", "mean"]].round(-2).sort_index()\
         .rename(columns={"median": "Median", "mean": "Mean"}).reset_index()
     fig = px.line(data_frame=grouped, x=group, y=["Median", "Mean"],
                   title=f"Trends in Claim Values Across {group.replace('_', ' ').title()}",
@@ -415,12 +386,22 @@ def plotly_age_line(data, group, **kwargs):
 
 
 def plotly_scatter_age(data, group=None):
-    fig = px.scatter(data, x="age", y="claim_amount", log_y=False, range_y=[0, data["claim_amount"].max()],
-                     title="Claim Value vs Age (Zoom to Inspect, Click Legend to Activate/Deactivate Groups)",
-                     color=group, symbol=group,
-                     labels={group: group.replace("_", " ").title() if group else group,
-                             "age": "Age", "claim_amount": "Claim Amount"})
     leg_title = group.replace('_', ' ').title() if group is not None else group
+
+    # WebGL traces, one per group in order of appearance with its own marker symbol
+    if group is None:
+        traces = [go.Scattergl(x=data["age"], y=data["claim_amount"], mode="markers", name="", showlegend=False,
+                               hovertemplate="Age=%{x}<br>Claim Amount=%{y}<extra></extra>")]
+    else:
+        symbols = ["circle", "diamond", "square", "x", "cross"]
+        traces = [go.Scattergl(x=group_data["age"], y=group_data["claim_amount"], mode="markers", name=str(name),
+                               marker=dict(symbol=symbols[i % len(symbols)]),
+                               hovertemplate=f"{leg_title}={name}<br>Age=%{{x}}<br>Claim Amount=%{{y}}<extra></extra>")
+                  for i, (name, group_data) in enumerate(data.groupby(group, observed=True, sort=False))]
+
+    fig = go.Figure(traces)
+    fig.update_layout(title="Claim Value vs Age (Zoom to Inspect, Click Legend to Activate/Deactivate Groups)",
+                      yaxis_range=[0, data["claim_amount"].max()])
     fig.update_layout(xaxis={"title": "Age"}, yaxis={"title": "Claim Value"},
                       legend_title=f"{leg_title}")
     fig.update_layout(scattermode="group", scattergap=.75)
@@ -430,28 +411,46 @@ def plotly_scatter_age(data, group=None):
 
 
 def plotly_pie(data, column, **kwargs):
-    fig = px.pie(data_frame=data, names=column, hole=.5,
-                 title=f"Proportions Observed in the Data: {column.replace('_', ' ').title()}",
-                 labels={column: column.replace('_', ' ').title()}, **kwargs)
+    proportions = value_proportions(data, [column])
+    fig = go.Figure(go.Pie(labels=proportions[column], values=proportions["proportion"], hole=.5, name="",
+                           hovertemplate=f"{column.replace('_', ' ').title()}=%{{label}}<extra></extra>"))
+    fig.update_layout(
+        title=f"Proportions Observed in the Data: {column.replace('_', ' ').title()}")
+    _apply_px_kwargs(fig, **kwargs)
     fig.update_layout(legend_title_text=f"{column.replace('_', ' ').title()}")
     # fig.update_traces(hovertemplate=f"Claim Amount %{y}<br> Statistic: %{x}<br>")
     return fig
 
 
+def plotly_treemap(data):
+    # plotly express would group categorical paths over every unseen make/model pair
+    proportions = value_proportions(data, ["auto_make", "auto_model"]).round(2).astype(
+        {"auto_make": object, "auto_model": object})
+
+    fig = px.treemap(proportions,
+                     path=["auto_make", "auto_model"], values="proportion", title="Distribution of Makes and Models")
+
+    fig.update_layout(margin=dict(t=50, l=25, r=25, b=25))
+    fig.update_traces(
+        hovertemplate="Vehicle %{label}<br>Percentage of Records %{value:.1%}")
+
+    return fig
+
+
 # ----------------------- Mariam Functions -------------------------------
-def plotly_mean_median_bar(data, group, **kwargs):  # KWARGS --------
+def plotly_mean_median_bar(stats, group, **kwargs):  # KWARGS --------
     """
-    Compatible with Most Datasets 
+    Compatible with Most Datasets, stats is the mean/median table of group from all_group_stats
     """
-    if "total_claim_amount" in data.columns:
-        data = data.rename(columns={"total_claim_amount": "claim_amount"})
-    grouped = data.groupby(group)["claim_amount"].agg(["mean", "median"]).round(2).reset_index(
+    grouped = stats.round(2).reset_index(
     ).sort_values(by="median", ascending=True).rename(columns={"mean": "Mean", "median": "Median"})
-    fig = px.bar(data_frame=grouped, x=group, y=['Median', 'Mean'],
-                 labels={'value': "Claim Value", group: group.replace(
-                     "_", " ").title(), "variable": "Statistic"},
-                 title=f'Mean and Median Claims by {group.replace("_", " ").title()}', barmode='group',
-                 color_continuous_scale="Viridis", **kwargs)  # KWARGS!!!!!!!!!!
+    group_title = group.replace("_", " ").title()
+    fig = go.Figure([go.Bar(x=grouped[group], y=grouped[statistic], name=statistic,
+                            hovertemplate=f"Statistic={statistic}<br>{group_title}=%{{x}}<br>Claim Value=%{{y}}<extra></extra>")
+                     for statistic in ["Median", "Mean"]])
+    fig.update_layout(title=f'Mean and Median Claims by {group_title}', barmode='group',
+                      xaxis_title=group_title, yaxis_title="Claim Value", legend_title_text="Statistic")
+    _apply_px_kwargs(fig, **kwargs)  # KWARGS!!!!!!!!!!
     # fig.update_layout(showlegend=True, width=1200, height=675)
     fig.update_layout(showlegend=True)
     fig.update_layout(yaxis=dict(tickformat='$,.2f'))
@@ -460,12 +459,18 @@ def plotly_mean_median_bar(data, group, **kwargs):  # KWARGS --------
 
 
 def plotly_filtered_claims(data, condition, **kwargs):
-    fig = px.histogram(data_frame=data["claim_amount"], labels={"claim_amount": "Claim Value USD"},
-                       title=f"Number of Claims by Value - {condition}", nbins=20, **kwargs)
+    # 20 equal-width bins counted here so only the counts are sent to the browser
+    counts, edges = np.histogram(data["claim_amount"].dropna().to_numpy(), bins=20)
+
+    # Bars sit at the bin centres, the bin edges are kept for the hover range
+    fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges),
+                           customdata=np.column_stack([edges[:-1], edges[1:]])))
+    fig.update_layout(title=f"Number of Claims by Value - {condition}", bargap=0)
+    _apply_px_kwargs(fig, **kwargs)
     fig.update_layout(legend_title="", xaxis={"title": "Claim Value"}, yaxis={
                       "title": "Number of Claims"})
     fig.update_traces(name="Claims", marker_line_color='black', marker_line_width=1.5,
-                      hovertemplate="Claim Value: %{x}<br> Number of Claims: %{y}")
+                      hovertemplate="Claim Value: %{customdata[0]:$,.2f} - %{customdata[1]:$,.2f}<br> Number of Claims: %{y}")
     fig.update_layout(xaxis=dict(tickformat='$,.2f'), showlegend=False)
     return fig
 
@@ -495,34 +500,52 @@ def plotly_filtered_claims_bar(data, **kwargs):
 
     return fig
 
-# ---------------------------------------- display function ------------------------------------------------------------------
 
+# Figures of the numbered sections depend only on the data, so they are all built in one cached call.
+# The plot helpers and the aggregations they use are not cached themselves
+@st.cache_resource(show_spinner=False)
+def static_figures(data):
+    # Mean/median tables of every grouping column, aggregated once and handed to the plot helpers
+    stats = all_group_stats(data)
+
+    figures = {"gender": plotly_gender(data),
+               "age_hist": plotly_age_hist(data, color_discrete_sequence=["sienna"]),
+               "age_bracket": plotly_age_bracket(stats["age_bracket"], template="seaborn"),
+               "age_bracket_line": plotly_age_line(stats["age_bracket"], "age_bracket", template="seaborn"),
+               "treemap": plotly_treemap(data),
+               "auto_make_bar": plotly_injury_bar(stats["auto_make"], "auto_make"),
+               "auto_model_bar": plotly_injury_bar(stats["auto_model"], "auto_model"),
+               "auto_year_bar": plotly_mean_median_bar(stats["auto_year"], "auto_year", template="presentation",
+                                                       layout=dict(xaxis=dict(tickvals=list(range(1995, 2016))))),
+               "auto_year_line": plotly_age_line(stats["auto_year"], "auto_year", template="presentation"),
+               "state_pie": plotly_pie(data, "state", template="presentation"),
+               "states": plotly_states(state_stats(data)),
+               "accident_type_bar": plotly_mean_median_bar(stats["accident_type"], "accident_type",
+                                                           template="seaborn"),
+               "collision_type_bar": plotly_mean_median_bar(stats["collision_type"], "collision_type"),
+               "incident_severity_bar": plotly_mean_median_bar(stats["incident_severity"], "incident_severity",
+                                                               template="seaborn"),
+               "bodily_injuries_bar": plotly_mean_median_bar(stats["bodily_injuries"], "bodily_injuries",
+                                                             color_discrete_sequence=["chocolate", "gray"]),
+               "authorities_contacted_bar": plotly_mean_median_bar(stats["authorities_contacted"],
+                                                                   "authorities_contacted", template="plotly"),
+               "authorities_contacted_scatter": plotly_scatter_age(data, "authorities_contacted"),
+               "police_report_available_bar": plotly_mean_median_bar(stats["police_report_available"],
+                                                                     "police_report_available",
+                                                                     color_discrete_sequence=["blue", "lightgrey"])}
+
+    for column in ["accident_type", "collision_type", "incident_severity", "bodily_injuries", "authorities_contacted",
+                   "police_report_available"]:
+        figures[f"{column}_pie"] = plotly_pie(data, column, template="presentation")
+
+    return figures
 
-def display_analysis():
 
-    # Car Insurance Data -----  ----------  -----------  --------------  -------------  ---------------  -------------------
-    df_ins = pd.read_csv("data/Insurance_claims_mendeleydata_6.csv")
+# ---------------------------------------- display function ------------------------------------------------------------------
 
-    # Process the insurance Data
-    df_ins = preprocess_insurance_data(df_ins)
-
-    st.header("**Analysis:**")
-    graph_description = """
-As you read through the analysis, we would also like you to be aware that these visualizations are interactive. 
-Most of the plots will allow you to zoom in on a region by clicking and dragging over an area with your mouse. 
-Also, if there is a legend in the upper-right of a visualization, you can click on an item in the legend to toggle that group on/off.
-"""
-    st.markdown(graph_description)
-
-    # -------------------------------------------------------------------------------------------------
-    # ------------------------ INSURANCE DATA ---------------------------------------------------------
-    # elif data_source == "Auto Insurance Claims":
-    data = df_ins
-    st.subheader("This dataset is comprised of car accident claims.")
-    st.write(
-        "The dataset Insurance_claims_mendeleydata_6.csv contains insurance claims data recorded over a two-month period, from January 1, 2015, to March 1, 2015.")
-    st.markdown("---")
 
+@st.fragment
+def _section_gender(figures):
     # Gender
     st.subheader("1. Gender:")
 
@@ -540,8 +563,11 @@ Both metrics indicate that, on average, female policyholders report similar but
 
     st.markdown(gender_paragraph)
 
-    st.plotly_chart(plotly_gender(data))
+    st.plotly_chart(figures["gender"])
+
 
+@st.fragment
+def _section_age(figures):
     # age_bracket
     st.subheader("2. Age:")
 
@@ -556,12 +582,13 @@ drivers tend to own more expensive cars, leading to higher claim settlements.
 # insurance claim risks and guiding strategic policy adjustments.
 
     st.markdown(age_paragraph)
-    st.plotly_chart(plotly_age_hist(
-        data, color_discrete_sequence=["sienna"]))
-    st.plotly_chart(plotly_age_bracket(data, template="seaborn"))
-    st.plotly_chart(plotly_age_line(
-        data, "age_bracket", template="seaborn"))
+    st.plotly_chart(figures["age_hist"])
+    st.plotly_chart(figures["age_bracket"])
+    st.plotly_chart(figures["age_bracket_line"])
+
 
+@st.fragment
+def _section_auto_make(figures):
     # Make of Car -> probably not that important
     st.subheader("3. Auto Manufacturer:")
     auto_paragraph = """
@@ -574,18 +601,15 @@ around \$11,000 from the highest average, BMW at \$54,000 to the lowest average,
     st.markdown(auto_paragraph)
 
     # Treemap
-    fig = px.treemap(data[["auto_make", "auto_model"]].value_counts(normalize=True).round(2).reset_index(),
-                     path=["auto_make", "auto_model"], values="proportion", title="Distribution of Makes and Models")
+    st.plotly_chart(figures["treemap"])
 
-    fig.update_layout(margin=dict(t=50, l=25, r=25, b=25))
-    fig.update_traces(
-        hovertemplate="Vehicle %{label}<br>Percentage of Records %{value:.1%}")
-    st.plotly_chart(fig)
+    st.plotly_chart(figures["auto_make_bar"])
 
-    st.plotly_chart(plotly_injury_bar(data, "auto_make"))
+    st.plotly_chart(figures["auto_model_bar"])
 
-    st.plotly_chart(plotly_injury_bar(data, "auto_model"))
 
+@st.fragment
+def _section_model_year(figures):
     # auto_year -> CURIOUS DATA, implies older cars are of a higher claim value
     st.subheader("4. Model year:")
     model_year_paragraph = """The analysis of auto year and claim amounts for this dataset indicate
@@ -598,11 +622,12 @@ ranging from \$42,853 to \$48,323, likely indicating improved vehicle safety and
 
 """
     st.markdown(model_year_paragraph)
-    st.plotly_chart(plotly_mean_median_bar(data, "auto_year", template="presentation")
-                    .update_layout(xaxis=dict(tickvals=np.arange(1995, 2016))))
-    st.plotly_chart(plotly_age_line(
-        data, "auto_year", template="presentation"))
+    st.plotly_chart(figures["auto_year_bar"])
+    st.plotly_chart(figures["auto_year_line"])
+
 
+@st.fragment
+def _section_state(figures):
     # States
     state1, state2 = st.columns([2, 2])
     with state1:
@@ -616,12 +641,15 @@ ranging from \$42,853 to \$48,323, likely indicating improved vehicle safety and
 """
         st.markdown(state_paragraph)
     with state2:
-        st.plotly_chart(plotly_pie(data, "state", template="presentation"))
-    st.plotly_chart(plotly_states(data))
+        st.plotly_chart(figures["state_pie"])
+    st.plotly_chart(figures["states"])
     # st.plotly_chart(plotly_box_states(data)) # Removed to avoid over complication
 
     # Incident Date showed a relatively stationary time series, not a lot of inferential value
 
+
+@st.fragment
+def _section_accident_type(figures):
     # accident_type
     acc1, acc2 = st.columns([2, 2])
     with acc1:
@@ -638,11 +666,12 @@ Parked car and vehicle theft incidents have notably lower average claim amounts
         st.markdown(accident_paragraph)
 
     with acc2:
-        st.plotly_chart(plotly_pie(
-            data, "accident_type", template="presentation"))
-    st.plotly_chart(plotly_mean_median_bar(
-        data, "accident_type", template="seaborn"))
+        st.plotly_chart(figures["accident_type_pie"])
+    st.plotly_chart(figures["accident_type_bar"])
 
+
+@st.fragment
+def _section_collision_type(figures):
     # collision_type
     coll1, coll2 = st.columns([2, 2])
     with coll1:
@@ -656,10 +685,12 @@ previously described, unattended vehicle claims receive substantially less.
         st.markdown(collision_paragraph)
 
     with coll2:
-        st.plotly_chart(plotly_pie(
-            data, "collision_type", template="presentation"))
-    st.plotly_chart(plotly_mean_median_bar(data, "collision_type"))
+        st.plotly_chart(figures["collision_type_pie"])
+    st.plotly_chart(figures["collision_type_bar"])
+
 
+@st.fragment
+def _section_incident_severity(figures):
     # incident_severity
     serv1, serv2 = st.columns([2, 2])
     with serv1:
@@ -676,11 +707,12 @@ smaller compensation at \$5,300 on average.
         st.markdown(severity_paragraph)
 
     with serv2:
-        st.plotly_chart(plotly_pie(
-            data, "incident_severity", template="presentation"))
-    st.plotly_chart(plotly_mean_median_bar(
-        data, "incident_severity", template="seaborn"))
+        st.plotly_chart(figures["incident_severity_pie"])
+    st.plotly_chart(figures["incident_severity_bar"])
+
 
+@st.fragment
+def _section_bodily_injuries(figures):
     # bodily_injuries
     injury1, injury2 = st.columns([2, 2])
     with injury1:
@@ -694,11 +726,12 @@ smaller compensation at \$5,300 on average.
         st.markdown(bodily_injuries_paragraph)
 
     with injury2:
-        st.plotly_chart(plotly_pie(
-            data, "bodily_injuries", template="presentation"))
-    st.plotly_chart(plotly_mean_median_bar(
-        data, "bodily_injuries", color_discrete_sequence=["chocolate", "gray"]))
+        st.plotly_chart(figures["bodily_injuries_pie"])
+    st.plotly_chart(figures["bodily_injuries_bar"])
 
+
+@st.fragment
+def _section_authorities_contacted(figures):
     # authorities_contacted
     author1, author2 = st.columns([2, 2])
     with author1:
@@ -717,14 +750,14 @@ less than \$18,s
         st.markdown(authorities_paragraph)
 
     with author2:
-        st.plotly_chart(plotly_pie(data.dropna(
-            subset="authorities_contacted"), "authorities_contacted", template="presentation"))
-        # st.plotly_chart(plotly_pie(
-        #     data, "authorities_contacted", template="presentation"))
-    st.plotly_chart(plotly_mean_median_bar(
-        data, "authorities_contacted", template="plotly"))
-    st.plotly_chart(plotly_scatter_age(data, "authorities_contacted"))
+        # value_proportions already leaves out the missing authorities, so no dropna copy is needed
+        st.plotly_chart(figures["authorities_contacted_pie"])
+    st.plotly_chart(figures["authorities_contacted_bar"])
+    st.plotly_chart(figures["authorities_contacted_scatter"])
+
 
+@st.fragment
+def _section_police_report(figures):
     # police_report_available
     pol1, pol2 = st.columns([2, 2])
     with pol1:
@@ -741,197 +774,158 @@ Cases where the availability of a police report was unknown showed a mean claim
         st.markdown(police_report_paragraph)
 
     with pol2:
-        st.plotly_chart(plotly_pie(
-            data, "police_report_available", template="presentation"))
-    st.plotly_chart(plotly_mean_median_bar(
-        data, "police_report_available", color_discrete_sequence=["blue", "lightgrey"]))
+        st.plotly_chart(figures["police_report_available_pie"])
+    st.plotly_chart(figures["police_report_available_bar"])
+
 
+@st.fragment
+def _section_filters(data):
     # --------------------------------- Filtering Conditions -------------------------------------------
 
     st.header("Try Out Multiple Filters:")
     st.write('If you would like to deactivate a filter select: "None"')
 
     # Age -------
-    min_age, max_age = st.slider("Age Range", min_value=data["age"].min().astype(int), max_value=data["age"].max().astype(int),
-                                 value=(data["age"].min().astype(int), data["age"].max().astype(int)), step=1)
+    age_min, age_max = data["age"].min().astype(int), data["age"].max().astype(int)
+    min_age, max_age = st.slider("Age Range", min_value=age_min, max_value=age_max,
+                                 value=(age_min, age_max), step=1)
 
-    # Boolean Mask for the Filter
-    age_condition = (data["age"] >= min_age) & (data["age"] <= max_age)
+    # Values of the selectbox filters that are not set to None
+    filters = {}
+
+    # Selectbox options of each filter (cached)
+    options = filter_options(data)
 
     col1, col2 = st.columns(2)
 
     # gender -----------
     with col1:
         gender_type_status = st.selectbox(
-            "Gender:", [None] + list(data["gender"].unique()), index=0)
+            "Gender:", [None] + options["gender"], index=0)
         if gender_type_status:
-            gender_type_condition = (data["gender"] == gender_type_status)
-        else:
-            gender_type_condition = True
+            filters["gender"] = gender_type_status
 
     # accident_type -----------
     with col2:
         accident_type_type_status = st.selectbox(
-            "Accident Type:", [None] + list(data["accident_type"].unique()), index=0)
+            "Accident Type:", [None] + options["accident_type"], index=0)
         if accident_type_type_status:
-            accident_type_condition = (
-                data["accident_type"] == accident_type_type_status)
-        else:
-            accident_type_condition = True
+            filters["accident_type"] = accident_type_type_status
 
     col3, col4 = st.columns(2)
 
     # collision_type -----------
     with col3:
         collision_type_status = st.selectbox(
-            "Collision Type:", [None] + list(data["collision_type"].unique()), index=0)
+            "Collision Type:", [None] + options["collision_type"], index=0)
         if collision_type_status:
-            collision_type_condition = (
-                data["collision_type"] == collision_type_status)
-        else:
-            collision_type_condition = True
+            filters["collision_type"] = collision_type_status
 
     # incident_severity -----------
     with col4:
         incident_severity_type_status = st.selectbox(
-            "Incident Severity:", [None] + list(data["incident_severity"].unique()), index=0)
+            "Incident Severity:", [None] + options["incident_severity"], index=0)
         if incident_severity_type_status:
-            incident_severity_type_condition = (
-                data["incident_severity"] == incident_severity_type_status)
-        else:
-            incident_severity_type_condition = True
+            filters["incident_severity"] = incident_severity_type_status
 
     col5, col6 = st.columns(2)
 
     # authorities_contacted -----------
     with col5:
         authorities_contacted_type_status = st.selectbox("Authorities Contacted:", [None] +
-                                                         list(data["authorities_contacted"].dropna().unique()), index=0)
+                                                         options["authorities_contacted"], index=0)
         if authorities_contacted_type_status:
-            authorities_contacted_condition = (
-                data["authorities_contacted"] == authorities_contacted_type_status)
-        else:
-            authorities_contacted_condition = True
+            filters["authorities_contacted"] = authorities_contacted_type_status
 
     # state -----------
     with col6:
         state_type_status = st.selectbox(
-            "State:", [None] + list(data["state"].unique()), index=0)
+            "State:", [None] + options["state"], index=0)
         if state_type_status:
-            state_condition = (data["state"] == state_type_status)
-        else:
-            state_condition = True
+            filters["state"] = state_type_status
 
     col7, col8 = st.columns(2)
 
     # property_damage -----------
     with col7:
         property_damage_type_status = st.selectbox(
-            "Property Damage:", [None] + list(data["property_damage"].unique()), index=0)
+            "Property Damage:", [None] + options["property_damage"], index=0)
         if property_damage_type_status:
-            property_damage_condition = (
-                data["property_damage"] == property_damage_type_status)
-        else:
-            property_damage_condition = True
+            filters["property_damage"] = property_damage_type_status
 
     # bodily_injuries -----------
     with col8:
         bodily_injuries_type_status = st.selectbox("Number of Bodily Injuries:", [
-            None] + list(data["bodily_injuries"].unique()), index=0)
+            None] + options["bodily_injuries"], index=0)
         if bodily_injuries_type_status:
-            bodily_injuries_condition = (
-                data["bodily_injuries"] == bodily_injuries_type_status)
-        else:
-            bodily_injuries_condition = True
+            filters["bodily_injuries"] = bodily_injuries_type_status
 
     col9, col10 = st.columns(2)
 
     # police_report_available -----------
     with col9:
         police_report_available_type_status = st.selectbox("Police Report Available?:", [
-            None] + list(data["police_report_available"].unique()), index=0)
+            None] + options["police_report_available"], index=0)
         if police_report_available_type_status:
-            police_report_available_condition = (
-                data["police_report_available"] == police_report_available_type_status)
-        else:
-            police_report_available_condition = True
+            filters["police_report_available"] = police_report_available_type_status
 
     # auto_make -----------
     with col10:
         auto_make_type_status = st.selectbox(
-            "Auto Make:", [None] + list(data["auto_make"].unique()), index=0)
+            "Auto Make:", [None] + options["auto_make"], index=0)
         if auto_make_type_status:
-            auto_make_condition = (
-                data["auto_make"] == auto_make_type_status)
-        else:
-            auto_make_condition = True
+            filters["auto_make"] = auto_make_type_status
 
     col11, col12 = st.columns(2)
 
     # auto_model -----------
     with col11:
         auto_model_type_status = st.selectbox(
-            "Auto Model:", [None] + list(data["auto_model"].unique()), index=0)
+            "Auto Model:", [None] + options["auto_model"], index=0)
         if auto_model_type_status:
-            auto_model_condition = (
-                data["auto_model"] == auto_model_type_status)
-        else:
-            auto_model_condition = True
+            filters["auto_model"] = auto_model_type_status
 
     # auto_year -----------
     with col12:
         auto_year_type_status = st.selectbox("Auto Year:", [
-            None] + list(data["auto_year"].sort_values(ascending=False).unique()), index=0)
+            None] + options["auto_year"], index=0)
         if auto_year_type_status:
-            auto_year_condition = (
-                data["auto_year"] == auto_year_type_status)
-        else:
-            auto_year_condition = True
+            filters["auto_year"] = auto_year_type_status
 
     # COLLECTING CONDITIONS  -----------------------------------------------------
-    all_conditions = age_condition & gender_type_condition & accident_type_condition\
-        & collision_type_condition & incident_severity_type_condition & authorities_contacted_condition\
-        & state_condition & property_damage_condition & bodily_injuries_condition & police_report_available_condition\
-        & auto_make_condition & auto_model_condition & auto_year_condition
+    claims = data["claim_amount"].to_numpy()
+
+    if (min_age, max_age) == (age_min, age_max) and not filters:
+        # No active filter: every row is selected, so skip building the masks
+        selected_data = data
+        selected_claims, excluded_claims = claims, claims[:0]
+    else:
+        # Boolean Mask for the Filter: all selectbox filters at once, then the age range
+        all_conditions = filter_mask(data, filters)
+        ages = data["age"].to_numpy()
+        all_conditions &= ages >= min_age
+        all_conditions &= ages <= max_age
+
+        # Claim values of the selected and excluded rows, sliced once and reused below
+        selected_data = data[all_conditions]
+        selected_claims = claims[all_conditions]
+        # Skip the excluded slice when every row is selected
+        excluded_claims = claims[~all_conditions] if selected_claims.size < claims.size else claims[:0]
 
     st.markdown("---")
 
     st.subheader("Here's a breakdown of the data you have selected:")
 
     # SUMMARY PLOTS
-    # DF for comparison of numeric profiles
-    description_table = pd.DataFrame(data[all_conditions]["claim_amount"].describe().round(2)).reset_index()\
-        .merge(pd.DataFrame(data[~all_conditions]["claim_amount"].describe()).reset_index()
-               .rename(columns={"claim_amount": "Excluded Data"})
-               .round(2)).reset_index()\
-        .rename(columns={
-            "claim_amount": "Selected Data",
-            "index": "Statistic"}).drop(columns="level_0")
-
-    # DF of all rows description
-    describe_df = pd.DataFrame()
-    describe_df["Statistic"] = description_table["Statistic"].copy()
-    describe_df["All Data"] = data["claim_amount"].describe().values.round(2)
-
-    # Merge 3rd df
-    description_table = description_table.merge(
-        describe_df, on="Statistic")
-
-    # Mapping the statistic values
-    description_table["Statistic"] = description_table["Statistic"].map({"count": "Number of Rows",
-                                                                         "mean": "Average Value",
-                                                                         "std": "Standard Deviation",
-                                                                         "min": "Minimum Value",
-                                                                         "25%": "25th Percentile Value",
-                                                                         "50%": "Median Value",
-                                                                         "75%": "75th Percentile Value",
-                                                                         "max": "Maximum Value"})
-
-    description_table.drop(2, inplace=True)
-    description_table = description_table.iloc[[0, 2, 3, 4, 1, 5, 6], :]
+    # DF for comparison of numeric profiles, rows are the describe() statistics in display order
+    description_table = pd.DataFrame({
+        "Statistic": list(SUMMARY_STATISTICS.values()),
+        "Selected Data": summary_statistics(selected_claims),
+        "Excluded Data": summary_statistics(excluded_claims),
+        "All Data": claim_summary(data)})
 
     # Sample size warning
-    if data[all_conditions].shape[0] <= 10:
+    if selected_claims.size <= 10:
         st.write(
             "This is a small subset of data, so use discretion when interpretting the results.")
 
@@ -940,15 +934,14 @@ Cases where the availability of a police report was unknown showed a mean claim
                  use_container_width=True, hide_index=True)
 
     # Only display distribution plots if there are 10 or more observations
-    if data[all_conditions].shape[0] >= 10:
-        distribution_skew_condition = (data[all_conditions]["claim_amount"].max() - data[all_conditions]["claim_amount"].quantile(.9)) >\
-            (data[all_conditions]["claim_amount"].quantile(.9) -
-                data[all_conditions]["claim_amount"].quantile(.75))
+    if selected_claims.size >= 10:
+        # Both percentiles from a single np.quantile call
+        q75, q90 = np.quantile(selected_claims, [.75, .9])
+        distribution_skew_condition = (selected_claims.max() - q90) > (q90 - q75)
 
         # Account for extreme outliers
         if distribution_skew_condition:
-            hist_data = data[all_conditions][data[all_conditions]["claim_amount"]
-                                             < data[all_conditions]["claim_amount"].quantile(.9)]
+            hist_data = pd.DataFrame({"claim_amount": selected_claims[selected_claims < q90]})
 
             condition = "Selected Data without Extreme Outliers"
             # Histogram
@@ -958,29 +951,62 @@ Cases where the availability of a police report was unknown showed a mean claim
 
         else:  # If not distribution_skew_condition
             condition = "Selected Data"
-            st.plotly_chart(plotly_filtered_claims(
-                data[all_conditions], condition))
+            hist_data = pd.DataFrame({"claim_amount": selected_claims})
+            st.plotly_chart(plotly_filtered_claims(hist_data, condition))
             # Boxplot
-            st.plotly_chart(plotly_boxplot_filtered(
-                data[all_conditions], condition))
+            st.plotly_chart(plotly_boxplot_filtered(hist_data, condition))
 
     # Comparison Bar Plot
     st.plotly_chart(plotly_filtered_claims_bar(
         description_table, template="plotly_white"))
 
     # Scatterplot of Claim vs Age
-    keys = [None] + list(data.select_dtypes(
-        exclude=np.number).columns.str.title().sort_values().str.replace("_", " "))
-    values = [
-        None] + sorted(list(data.select_dtypes(exclude=np.number).columns), key=lambda x: x.lower())
-    age_col_dict = dict(zip(keys, values))
+    keys, age_col_dict = scatter_group_options(data)
 
     st.subheader("Use the Scatterplot to Explore Groups from the Data")
     group = st.selectbox("Select Subsets of the Data:", keys)
     st.plotly_chart(plotly_scatter_age(
-        data[all_conditions], age_col_dict[group]))
+        selected_data, age_col_dict[group]))
+
+
+def display_analysis():
+
+    # Car Insurance Data -----  ----------  -----------  --------------  -------------  ---------------  -------------------
+    # Read and process the insurance Data (cached)
+    df_ins = load_insurance("data/Insurance_claims_mendeleydata_6.csv")
+
+    st.header("**Analysis:**")
+    graph_description = """
+As you read through the analysis, we would also like you to be aware that these visualizations are interactive. 
+Most of the plots will allow you to zoom in on a region by clicking and dragging over an area with your mouse. 
+Also, if there is a legend in the upper-right of a visualization, you can click on an item in the legend to toggle that group on/off.
+"""
+    st.markdown(graph_description)
+
+    # -------------------------------------------------------------------------------------------------
+    # ------------------------ INSURANCE DATA ---------------------------------------------------------
+    # elif data_source == "Auto Insurance Claims":
+    data = df_ins
+    st.subheader("This dataset is comprised of car accident claims.")
+    st.write(
+        "The dataset Insurance_claims_mendeleydata_6.csv contains insurance claims data recorded over a two-month period, from January 1, 2015, to March 1, 2015.")
+    st.markdown("---")
 
-    # -------------------------------- Summary with Filters -----------------------------------
+    figures = static_figures(data)
+
+    # Each numbered section is a fragment, so a widget inside one section only reruns that section
+    _section_gender(figures)
+    _section_age(figures)
+    _section_auto_make(figures)
+    _section_model_year(figures)
+    _section_state(figures)
+    _section_accident_type(figures)
+    _section_collision_type(figures)
+    _section_incident_severity(figures)
+    _section_bodily_injuries(figures)
+    _section_authorities_contacted(figures)
+    _section_police_report(figures)
+    _section_filters(data)
 
 
 if __name__ == "__main__":
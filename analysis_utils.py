@@ -0,0 +1,374 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Columns of Insurance_claims_mendeleydata_6.csv that are not used by the analysis
+DROPPED_COLUMNS = ["policy_state", "policy_csl", "policy_deductable", "policy_annual_premium",
+                   "umbrella_limit", "policy_number", "capital-gains", "capital-loss", "city", "injury_claim",
+                   "property_claim", "vehicle_claim"]
+
+# Compact dtypes for the remaining columns, low-cardinality text columns are read as categoricals
+INSURANCE_DTYPES = {"age": "int8", "total_claim_amount": "int32", "auto_year": "int16", "bodily_injuries": "int8",
+                    "state": "category", "auto_make": "category", "auto_model": "category",
+                    "collision_type": "category", "incident_severity": "category",
+                    "accident_type": "category", "authorities_contacted": "category",
+                    "property_damage": "category", "police_report_available": "category"}
+
+
+# Processing for insurance data
+def preprocess_insurance_data(data):
+    """
+    Preprocessing steps for Insurance_claims_mendeleydata_6.csv
+    to be transformed in a manner that allows for state-wise visualization
+
+    Args
+    ---------------
+    data: pd.DataFrame | pandas dataframe to be used for state-wise plots
+
+    Returns
+    ---------------
+    data : pd.DataFrame | preprocessed with minimal steps 
+
+    Errors Raised
+    ---------------
+    KeyError | if data is missing the insured_sex, age or collision_type columns,
+    columns of DROPPED_COLUMNS that are not present are skipped
+
+    """
+
+    data = data.rename(columns={"total_claim_amount": "claim_amount",
+                                "insured_sex": "gender"})
+    data["gender"] = data["gender"].str.title().astype("category")
+
+    # Bins for Age Plots
+    # bins = [-np.inf, 2, 12, 18, 35, 60, np.inf]
+    # labels = ["Infant 0-2", "Child 2-12", "Teenager 12-18", "Young Adult 18-35",
+    #       "Adult 35-60", "Senior Citizen 60+"]
+
+    # Bins #2
+    bins = [15, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65]
+    labels = ["15-20", "20-25", "25-30", "30-35", "35-40", "40-45", "45-50", "50-55", "55-60",
+              "60-65"]
+
+    # Same right-closed bins as pd.cut, ages outside (15, 65] get code -1 (missing)
+    codes = np.searchsorted(bins, data["age"].to_numpy(), side="left") - 1
+    codes[codes >= len(labels)] = -1
+    data["age_bracket"] = pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+
+    data = data.drop(columns=DROPPED_COLUMNS, errors="ignore")
+
+    data["collision_type"] = data["collision_type"].astype("category").cat.rename_categories(
+        {"?": "Unattended Vehicle"})
+
+    return data
+
+
+@st.cache_data(show_spinner=False)
+def load_insurance(path):
+    """
+    Reads and preprocesses Insurance_claims_mendeleydata_6.csv once, cached across Streamlit reruns
+
+    Args
+    ---------------
+    path: str | path to the insurance claims csv
+
+    Returns
+    ---------------
+    data : pd.DataFrame | output of preprocess_insurance_data, unused columns are skipped at parse time
+    """
+
+    data = pd.read_csv(path, usecols=lambda column: column not in DROPPED_COLUMNS,
+                       dtype=INSURANCE_DTYPES)
+
+    return preprocess_insurance_data(data)
+
+
+def group_mean_median(data, group):
+    """
+    Mean and median claim value per group, computed in a single sorted pass over factorized group codes.
+    Shared by the mean/median plots in place of groupby(group)["claim_amount"].agg(["mean", "median"])
+
+    Args
+    -----------
+    data: pd.DataFrame | data with columns: [group, "claim_amount"]
+    group: str | column to group by
+
+    Returns
+    -----------
+    pd.DataFrame | columns ["mean", "median"] indexed by the sorted group values, missing groups are dropped
+
+    Errors
+    -----------
+    KeyError if data do not contain the correct columns
+    """
+    codes, uniques = pd.factorize(data[group], sort=True)
+    values = data["claim_amount"].to_numpy(np.float64)
+
+    # Missing group keys and claim values are skipped like in groupby
+    valid = (codes >= 0) & ~np.isnan(values)
+    codes, values = codes[valid], values[valid]
+
+    # Sort claim values within each group so both statistics come from one pass
+    order = np.lexsort((values, codes))
+    sorted_values = values[order]
+
+    counts = np.bincount(codes, minlength=len(uniques))
+    sums = np.bincount(codes, weights=values, minlength=len(uniques))
+    starts = np.cumsum(counts) - counts
+
+    observed = counts > 0
+    counts, sums, starts = counts[observed], sums[observed], starts[observed]
+    medians = (sorted_values[starts + (counts - 1) // 2] +
+               sorted_values[starts + counts // 2]) / 2
+
+    index = pd.Index(uniques[observed], name=group)
+
+    return pd.DataFrame({"mean": sums / counts, "median": medians}, index=index)
+
+
+# Columns plotted as mean/median claims by group in display_analysis
+GROUP_STATS_COLUMNS = ["age_bracket", "auto_make", "auto_model", "auto_year", "accident_type", "collision_type",
+                       "incident_severity", "bodily_injuries", "authorities_contacted", "police_report_available"]
+
+
+def all_group_stats(data):
+    """
+    Mean/median claim tables for every column in GROUP_STATS_COLUMNS
+
+    Args
+    -----------
+    data: pd.DataFrame | data with a "claim_amount" column
+
+    Returns
+    -----------
+    dict | column name -> output of group_mean_median, for the columns present in data
+    """
+    return {group: group_mean_median(data, group) for group in GROUP_STATS_COLUMNS if group in data.columns}
+
+
+# Per-state statistics for the state-wise plots
+StateStats = namedtuple("StateStats", ["order", "means", "medians", "q25", "q75", "values"])
+
+
+def state_stats(data):
+    """
+    Per-state claim statistics shared by the state-wise plots, computed from a single split of the claim values
+
+    Args
+    -----------
+    data: pd.DataFrame | data with columns: ["state", "claim_amount"]
+
+    Returns
+    -----------
+    StateStats | states ordered by descending median claim, mean/median/25th/75th percentile Series
+    in that order, and a dict of claim values per state. Miscellaneous states ("Other") are left out
+
+    Errors
+    -----------
+    KeyError if data do not contain the correct columns
+    """
+    # Filtering out miscellaneous states
+    data = data.loc[data["state"].ne("Other"), ["state", "claim_amount"]]
+
+    values = {state: group.to_numpy()
+              for state, group in data.groupby("state", observed=True)["claim_amount"]}
+
+    states = np.array(list(values), dtype=object)
+    medians = np.array([np.median(v) for v in values.values()])
+
+    # States ordered by descending median, ties keep their alphabetical order
+    order = np.argsort(-medians, kind="stable")
+    index = pd.Index(states[order], name="state")
+
+    means = pd.Series([np.mean(values[state]) for state in index], index=index)
+    quartiles = np.array([np.quantile(values[state], [0.25, 0.75]) for state in index]).reshape(-1, 2)
+
+    return StateStats(order=list(index), means=means, medians=pd.Series(medians[order], index=index),
+                      q25=pd.Series(quartiles[:, 0], index=index), q75=pd.Series(quartiles[:, 1], index=index),
+                      values=values)
+
+
+def kde_curves(male_values, female_values):
+    """
+    KDE curves of the male and female claim distributions evaluated on a shared grid
+
+    Args
+    -----------
+    male_values: np.ndarray | claim values of male policy holders
+    female_values: np.ndarray | claim values of female policy holders
+
+    Returns
+    -----------
+    (x, male_y, female_y) | np.ndarray coordinates of the KDE curves
+    """
+    # Deferred so scipy is only imported when the KDE is actually computed
+    from scipy.stats import gaussian_kde
+
+    x = np.linspace(min(male_values.min(), female_values.min()),
+                    max(male_values.max(), female_values.max()), 500)
+
+    return x, gaussian_kde(male_values)(x), gaussian_kde(female_values)(x)
+
+
+def value_proportions(data, columns):
+    """
+    Proportion of rows for each observed combination of values in columns
+
+    Args
+    -----------
+    data: pd.DataFrame | data containing columns
+    columns: list | columns to count combinations of, rows with missing values are left out
+
+    Returns
+    -----------
+    pd.DataFrame | columns plus a "proportion" column, sorted by descending proportion
+    """
+    # observed=True keeps categorical columns from expanding to every unobserved combination
+    counts = data.groupby(columns, observed=True).size()
+    proportions = (counts / counts.sum()).sort_values(ascending=False).rename("proportion")
+
+    return proportions.reset_index()
+
+
+# describe() statistics shown in the filter summary table, in display order, with their row labels
+SUMMARY_STATISTICS = {"count": "Number of Rows",
+                      "min": "Minimum Value",
+                      "25%": "25th Percentile Value",
+                      "50%": "Median Value",
+                      "mean": "Average Value",
+                      "75%": "75th Percentile Value",
+                      "max": "Maximum Value"}
+
+
+def summary_statistics(values):
+    """
+    SUMMARY_STATISTICS of an array of claim values, computed on the array itself instead of through
+    pd.Series.describe(). Percentiles use the same linear interpolation as describe()
+
+    Args
+    -----------
+    values: np.ndarray | claim values without missing values
+
+    Returns
+    -----------
+    np.ndarray | SUMMARY_STATISTICS in display order, rounded to 2 decimals.
+    An empty array gives a count of 0 and NaN for the other statistics
+    """
+    if values.size == 0:
+        return np.array([0.] + [np.nan] * (len(SUMMARY_STATISTICS) - 1))
+
+    minimum, q25, median, q75, maximum = np.quantile(values, [0, .25, .5, .75, 1])
+
+    return np.array([values.size, minimum, q25, median, values.mean(), q75, maximum]).round(2)
+
+
+@st.cache_data(show_spinner=False)
+def claim_summary(data):
+    """
+    SUMMARY_STATISTICS of the claim values of every row, cached so the "All Data" column of the filter summary
+    is not recomputed on each rerun
+
+    Args
+    -----------
+    data: pd.DataFrame | data with column "claim_amount"
+
+    Returns
+    -----------
+    np.ndarray | SUMMARY_STATISTICS in display order, rounded to 2 decimals
+    """
+    return summary_statistics(data["claim_amount"].to_numpy())
+
+
+@st.cache_data(show_spinner=False)
+def scatter_group_options(data):
+    """
+    Selectbox labels of the non-numeric columns the age scatterplot can be grouped by, cached across reruns
+
+    Args
+    -----------
+    data: pd.DataFrame | data to take the non-numeric columns from
+
+    Returns
+    -----------
+    tuple | (list of labels starting with None, dict label -> column name)
+    """
+    columns = data.select_dtypes(exclude=np.number).columns
+    keys = [None] + list(columns.str.title().sort_values().str.replace("_", " "))
+    values = [None] + sorted(columns, key=lambda x: x.lower())
+
+    return keys, dict(zip(keys, values))
+
+
+# Columns offered as selectbox filters in display_analysis
+FILTER_COLUMNS = ["gender", "accident_type", "collision_type", "incident_severity", "authorities_contacted", "state",
+                  "property_damage", "bodily_injuries", "police_report_available", "auto_make", "auto_model",
+                  "auto_year"]
+
+
+@st.cache_data(show_spinner=False)
+def filter_options(data):
+    """
+    Selectbox options of every filter column, computed once and cached across reruns
+
+    Args
+    -----------
+    data: pd.DataFrame | data containing the FILTER_COLUMNS
+
+    Returns
+    -----------
+    dict | column name -> list of unique non-missing values in order of appearance,
+    auto_year is sorted from newest to oldest
+    """
+    options = {column: list(data[column].dropna().unique()) for column in FILTER_COLUMNS}
+    # Sort the few unique years rather than the whole column, newest first
+    options["auto_year"] = list(np.sort(data["auto_year"].unique())[::-1])
+
+    return options
+
+
+def equals_mask(column, value):
+    """
+    Boolean mask of the rows of column equal to value. Categorical columns are compared on their integer codes
+    instead of the object values
+
+    Args
+    -----------
+    column: pd.Series | column to compare
+    value: scalar | value to match
+
+    Returns
+    -----------
+    np.ndarray | boolean mask of the same length as column
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        categories = column.cat.categories
+        if value not in categories:
+            return np.zeros(len(column), dtype=bool)
+
+        return column.cat.codes.to_numpy() == categories.get_loc(value)
+
+    return (column == value).to_numpy()
+
+
+def filter_mask(data, filters):
+    """
+    Boolean mask of the rows matching every filter, built with one in-place AND per active filter
+
+    Args
+    -----------
+    data: pd.DataFrame | data containing the filtered columns
+    filters: dict | column name -> value the column must equal
+
+    Returns
+    -----------
+    np.ndarray | boolean mask of the same length as data, all True if filters is empty
+    """
+    mask = np.ones(len(data), dtype=bool)
+    for column, value in filters.items():
+        np.logical_and(mask, equals_mask(data[column], value), out=mask)
+        # Once no row is left the remaining filters cannot change the mask
+        if not mask.any():
+            break
+
+    return mask